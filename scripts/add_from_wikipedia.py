@@ -25,16 +25,26 @@ from urllib.parse import urlparse, unquote
 import requests
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:  # libyaml not available; fall back to the pure-Python parser
+    from yaml import SafeLoader, SafeDumper
+
 
 WIKI_API = "https://en.wikipedia.org/w/api.php"
 
+_WIKI_PATH_RE = re.compile(r"/wiki/([^?#]+)")
+_SLUG_APOS_RE = re.compile(r"[’'`]")
+_SLUG_NONALNUM_RE = re.compile(r"[^a-z0-9]+")
+_SLUG_DASHES_RE = re.compile(r"-{2,}")
+
 
 def wikipedia_title_from_url(url: str) -> str:
     p = urlparse(url)
     if "wikipedia.org" not in p.netloc:
         raise ValueError("URL does not look like a Wikipedia URL.")
     # /wiki/Title
-    m = re.search(r"/wiki/([^?#]+)", p.path)
+    m = _WIKI_PATH_RE.search(p.path)
     if not m:
         raise ValueError("Could not extract /wiki/<title> from URL.")
     return unquote(m.group(1)).replace("_", " ")
@@ -42,9 +52,9 @@ def wikipedia_title_from_url(url: str) -> str:
 
 def slugify(text: str) -> str:
     text = text.strip().lower()
-    text = re.sub(r"[’'`]", "", text)
-    text = re.sub(r"[^a-z0-9]+", "-", text)
-    text = re.sub(r"-{2,}", "-", text).strip("-")
+    text = _SLUG_APOS_RE.sub("", text)
+    text = _SLUG_NONALNUM_RE.sub("-", text)
+    text = _SLUG_DASHES_RE.sub("-", text).strip("-")
     return text or "poi"
 
 
@@ -90,16 +100,12 @@ def fetch_wikipedia_extract_and_props(title: str) -> dict:
 
 def load_yaml(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=SafeLoader)
 
 
 def save_yaml(path: str, obj: dict) -> None:
     with open(path, "w", encoding="utf-8") as f:
-        yaml.safe_dump(obj, f, sort_keys=False, allow_unicode=True, width=100)
-
-
-def region_exists(doc: dict, region_id: str) -> bool:
-    return any(r.get("id") == region_id for r in doc.get("regions", []))
+        yaml.dump(obj, f, Dumper=SafeDumper, sort_keys=False, allow_unicode=True, width=100)
 
 
 def main():
@@ -113,7 +119,12 @@ def main():
     args = ap.parse_args()
 
     doc = load_yaml(args.yaml)
-    if not region_exists(doc, args.region):
+
+    # Build id sets once so every lookup below is O(1).
+    region_ids = {r.get("id") for r in doc.get("regions", [])}
+    existing_ids = {p.get("id") for p in doc.get("pois", [])}
+
+    if args.region not in region_ids:
         raise SystemExit(f"Region id not found in YAML: {args.region}")
 
     title = wikipedia_title_from_url(args.wikipedia)
@@ -122,7 +133,6 @@ def main():
     poi_id = slugify(info["title"])
 
     # Avoid collisions
-    existing_ids = {p.get("id") for p in doc.get("pois", [])}
     base_id = poi_id
     i = 2
     while poi_id in existing_ids:
@@ -155,6 +165,7 @@ def main():
         poi["location"]["coordinates"] = {"lat": float(info["lat"]), "lon": float(info["lon"])}
 
     doc.setdefault("pois", []).append(poi)
+    existing_ids.add(poi_id)
     save_yaml(args.yaml, doc)
 
     print(f"Added POI: {poi_id}  ({info['title']})")
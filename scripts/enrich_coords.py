@@ -15,21 +15,105 @@ Usage (local):
 """
 
 import argparse
+import asyncio
+import hashlib
+import json
 import re
-from urllib.parse import urlparse, unquote
+import time
+from pathlib import Path
+from urllib.parse import urlencode, urlparse, unquote
 
-import requests
+import aiohttp
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:  # libyaml not available; fall back to the pure-Python parser
+    from yaml import SafeLoader, SafeDumper
+
+try:
+    from orjson import loads as json_loads, dumps as json_dumps
+except ImportError:  # orjson not available; fall back to stdlib (bytes in/out)
+    def json_loads(data):
+        return json.loads(data)
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
 USER_AGENT = "tripkit/0.1 (coords enrichment)"
 TIMEOUT = 30
+MAX_CONCURRENCY = 32
+_WIKI_PATH_RE = re.compile(r"/wiki/([^?#]+)")
+BATCH_SIZE = 50  # MediaWiki allows up to 50 titles per query for non-bot accounts.
+CACHE_DIR = Path(".wiki_cache")
+CACHE_TTL = 86400  # seconds; re-runs within a day skip unchanged lookups entirely
+RATE_LIMIT = 200  # requests/second, the polite ceiling for MediaWiki clients
+MAX_RETRIES = 5
+
+
+class TokenBucket:
+    """Paces coroutines to `rate` acquisitions per second, shared across tasks."""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.capacity = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+LIMITER = TokenBucket(RATE_LIMIT)
+
+
+def retry_delay(retry_after: str | None, attempt: int) -> float:
+    """Honor a Retry-After header if usable, else capped exponential back-off."""
+    if retry_after:
+        try:
+            return min(60.0, float(retry_after))
+        except ValueError:
+            pass
+    return min(60.0, 2.0 ** attempt)
+
+
+def _cache_path(url: str, params: dict) -> Path:
+    key = hashlib.sha256(f"{url}?{urlencode(sorted(params.items()))}".encode()).hexdigest()
+    return CACHE_DIR / f"{key}.json"
+
+
+def cache_get(url: str, params: dict) -> dict | None:
+    p = _cache_path(url, params)
+    try:
+        if time.time() - p.stat().st_mtime < CACHE_TTL:
+            return json_loads(p.read_bytes())
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def cache_put(url: str, params: dict, data: dict) -> None:
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        _cache_path(url, params).write_bytes(json_dumps(data))
+    except OSError:
+        pass  # cache is best-effort
 
 
 def wiki_title_from_url(url: str) -> tuple[str, str]:
     u = urlparse(url)
     host = (u.netloc or "").lower()
     lang = host.split(".")[0] if "wikipedia.org" in host else "en"
-    m = re.search(r"/wiki/([^?#]+)", u.path)
+    m = _WIKI_PATH_RE.search(u.path)
     if not m:
         raise ValueError("Could not parse /wiki/<title> from wikipedia URL")
     title = unquote(m.group(1)).replace("_", " ")
@@ -40,65 +124,97 @@ def mw_api(lang: str) -> str:
     return f"https://{lang}.wikipedia.org/w/api.php"
 
 
-def mw_query(lang: str, params: dict) -> dict:
+async def mw_query(session: aiohttp.ClientSession, lang: str, params: dict) -> dict:
     params = dict(params)
     params["action"] = "query"
     params["format"] = "json"
     params["formatversion"] = 2
     params["origin"] = "*"
-    r = requests.get(mw_api(lang), params=params, headers={"User-Agent": USER_AGENT}, timeout=TIMEOUT)
-    r.raise_for_status()
-    return r.json()
-
-
-def fetch_coords_and_qid(lang: str, title: str) -> dict | None:
-    data = mw_query(
+    params["maxlag"] = 5  # back off instead of piling onto lagged replicas
+    url = mw_api(lang)
+    cached = cache_get(url, params)
+    if cached is not None:
+        return cached
+    for attempt in range(MAX_RETRIES):
+        await LIMITER.acquire()
+        async with session.get(url, params=params) as r:
+            if r.status in (429, 503) and attempt < MAX_RETRIES - 1:
+                await asyncio.sleep(retry_delay(r.headers.get("Retry-After"), attempt))
+                continue
+            r.raise_for_status()
+            data = json_loads(await r.read())
+        cache_put(url, params, data)
+        return data
+
+
+async def fetch_coords_and_qids(session: aiohttp.ClientSession, lang: str, titles: list[str]) -> dict[str, dict]:
+    """Fetch coords + QID for up to BATCH_SIZE titles in one API call.
+
+    Returns a dict keyed by the *requested* title; missing pages are absent.
+    """
+    data = await mw_query(
+        session,
         lang,
         {
             "prop": "coordinates|pageprops",
             "redirects": 1,
-            "titles": title,
-            "colimit": 1,
+            "titles": "|".join(titles),
+            "colimit": BATCH_SIZE,
             "ppprop": "wikibase_item",
         },
     )
-    pages = data.get("query", {}).get("pages", [])
-    if not pages or pages[0].get("missing"):
-        return None
+    query = data.get("query", {})
 
-    page = pages[0]
-    coords = page.get("coordinates") or []
-    lat = lon = None
-    if coords:
-        lat = coords[0].get("lat")
-        lon = coords[0].get("lon")
+    # The API normalizes and follows redirects; map requested -> final title.
+    remap = {}
+    for step in (query.get("normalized") or []) + (query.get("redirects") or []):
+        if step.get("from") and step.get("to"):
+            remap[step["from"]] = step["to"]
 
-    qid = (page.get("pageprops") or {}).get("wikibase_item")
-    return {"lat": lat, "lon": lon, "qid": qid}
+    by_title = {}
+    for page in query.get("pages", []) or []:
+        if page.get("missing"):
+            continue
+        coords = page.get("coordinates") or []
+        lat = lon = None
+        if coords:
+            lat = coords[0].get("lat")
+            lon = coords[0].get("lon")
+        qid = (page.get("pageprops") or {}).get("wikibase_item")
+        by_title[page.get("title")] = {"lat": lat, "lon": lon, "qid": qid}
+
+    out = {}
+    for t in titles:
+        final = t
+        seen = set()
+        while final in remap and final not in seen:
+            seen.add(final)
+            final = remap[final]
+        info = by_title.get(final)
+        if info:
+            out[t] = info
+    return out
 
 
 def load_yaml(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=SafeLoader)
 
 
 def save_yaml(path: str, obj: dict) -> None:
     with open(path, "w", encoding="utf-8") as f:
-        yaml.safe_dump(obj, f, sort_keys=False, allow_unicode=True, width=110)
+        yaml.dump(obj, f, Dumper=SafeDumper, sort_keys=False, allow_unicode=True, width=110)
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--yaml", required=True, help="Path to YAML file (e.g. data/ww1-belgium.yaml)")
-    ap.add_argument("--overwrite", action="store_true", help="Overwrite existing coordinates if present.")
-    args = ap.parse_args()
-
+async def main_async(args) -> None:
     doc = load_yaml(args.yaml)
     pois = doc.get("pois", [])
     updated = 0
     no_coords = 0
     no_page = 0
 
+    # First pass: collect the POIs that actually need a lookup.
+    todo: list[tuple[dict, str, str]] = []
     for p in pois:
         wiki = ((p.get("links") or {}).get("wikipedia") or "").strip()
         if not wiki:
@@ -114,11 +230,45 @@ def main():
             no_page += 1
             continue
 
-        try:
-            info = fetch_coords_and_qid(lang, title)
-        except Exception:
-            info = None
+        todo.append((p, lang, title))
+
+    # Group by language and chunk into batches of BATCH_SIZE titles,
+    # collapsing N requests into ceil(N/50) per language. A dict keeps the
+    # titles unique, so POIs sharing a Wikipedia link are fetched once.
+    by_lang: dict[str, dict[str, None]] = {}
+    for _, lang, title in todo:
+        by_lang.setdefault(lang, {})[title] = None
+
+    batches = [
+        (lang, list(titles)[i : i + BATCH_SIZE])
+        for lang, titles in by_lang.items()
+        for i in range(0, len(titles), BATCH_SIZE)
+    ]
+
+    # Fetch batches concurrently; one session gives us connection pooling.
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def fetch_batch(session: aiohttp.ClientSession, lang: str, titles: list[str]) -> dict[str, dict]:
+        async with sem:
+            return await fetch_coords_and_qids(session, lang, titles)
+
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout, headers={"User-Agent": USER_AGENT}) as session:
+        batch_results = await asyncio.gather(
+            *(fetch_batch(session, lang, titles) for lang, titles in batches),
+            return_exceptions=True,
+        )
+
+    results: dict[tuple[str, str], dict] = {}
+    for (lang, titles), res in zip(batches, batch_results):
+        if isinstance(res, BaseException):
+            continue
+        for title, info in res.items():
+            results[(lang, title)] = info
 
+    # Second pass: apply results to the YAML.
+    for p, lang, title in todo:
+        info = results.get((lang, title))
         if not info:
             no_page += 1
             continue
@@ -126,7 +276,7 @@ def main():
         if info["lat"] is None or info["lon"] is None:
             no_coords += 1
         else:
-            loc["coordinates"] = {"lat": float(info["lat"]), "lon": float(info["lon"])}
+            p["location"]["coordinates"] = {"lat": float(info["lat"]), "lon": float(info["lon"])}
             updated += 1
 
         links = p.setdefault("links", {})
@@ -137,5 +287,13 @@ def main():
     print(f"Done. Updated coords: {updated}. Pages missing: {no_page}. No coords on page: {no_coords}.")
 
 
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--yaml", required=True, help="Path to YAML file (e.g. data/ww1-belgium.yaml)")
+    ap.add_argument("--overwrite", action="store_true", help="Overwrite existing coordinates if present.")
+    args = ap.parse_args()
+    asyncio.run(main_async(args))
+
+
 if __name__ == "__main__":
     main()
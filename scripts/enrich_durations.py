@@ -14,6 +14,11 @@ from pathlib import Path
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:  # libyaml not available; fall back to the pure-Python parser
+    from yaml import SafeLoader, SafeDumper
+
 
 THEME_TO_BUCKET = {
     # history / war context
@@ -48,6 +53,25 @@ THEME_TO_BUCKET = {
     "cocktails": "food-nightlife",
 }
 
+_DIGITS_RE = re.compile(r"\d+")
+
+# One alternation scan per theme instead of five separate substring sweeps;
+# group names map to the duration buckets below.
+_BUCKET_RE = re.compile(
+    r"(?P<hw>ww[12]|cold|battle|front|trench|fortress|invasion)"
+    r"|(?P<rm>remembr)"
+    r"|(?P<ca>museum|art|architect|gallery)"
+    r"|(?P<ow>park|outdoor|walk|hike|trail|landscape)"
+    r"|(?P<fn>food|bar|club|cocktail|night|vibe|restaurant)"
+)
+_GROUP_TO_BUCKET = {
+    "hw": "history-war",
+    "rm": "remembrance",
+    "ca": "culture-art",
+    "ow": "outdoors-walks",
+    "fn": "food-nightlife",
+}
+
 TYPE_DEFAULTS = {
     "hotel": (0, 0),
     "food": (45, 105),
@@ -75,6 +99,10 @@ TYPE_DEFAULTS = {
     "palace": (75, 180),
 }
 
+_FOOD_TYPES = frozenset({"food", "nightlife", "bar", "cafe", "restaurant"})
+_REMEMBRANCE_TYPES = frozenset({"memorial", "cemetery", "monument"})
+_OUTDOOR_TYPES = frozenset({"park", "trench", "battlefield"})
+
 
 def parse_minutes_from_string(s: str):
     """Parse strings like '60–120 min', '45-90 min', '90 min', 'Half day'."""
@@ -88,7 +116,7 @@ def parse_minutes_from_string(s: str):
     if "multi-day" in t:
         return (300, 420)
 
-    nums = [int(x) for x in re.findall(r"\d+", t)]
+    nums = [int(x) for x in _DIGITS_RE.findall(t)]
     if len(nums) == 1:
         n = max(5, nums[0])
         return (n, n)
@@ -105,28 +133,29 @@ def buckets_for(poi: dict):
     b = set()
     typ = str(poi.get("type") or "").lower()
 
-    if typ in {"food", "nightlife", "bar", "cafe", "restaurant"}:
+    if typ in _FOOD_TYPES:
         b.add("food-nightlife")
     if typ == "museum":
         b.add("culture-art")
-    if typ in {"memorial", "cemetery", "monument"}:
+    if typ in _REMEMBRANCE_TYPES:
         b.add("remembrance")
-    if typ in {"park", "trench", "battlefield"}:
+    if typ in _OUTDOOR_TYPES:
         b.add("outdoors-walks")
 
+    # Bind the loop's globals as locals; saves a LOAD_GLOBAL per theme.
+    _ttb_get = THEME_TO_BUCKET.get
+    _gtb = _GROUP_TO_BUCKET
+    _finditer = _BUCKET_RE.finditer
+    _add = b.add
+
     for t in themes:
-        if t in THEME_TO_BUCKET:
-            b.add(THEME_TO_BUCKET[t])
-        if any(k in t for k in ["ww1", "ww2", "cold", "battle", "front", "trench", "fortress", "invasion"]):
-            b.add("history-war")
-        if "remembr" in t:
-            b.add("remembrance")
-        if any(k in t for k in ["museum", "art", "architect", "gallery"]):
-            b.add("culture-art")
-        if any(k in t for k in ["park", "outdoor", "walk", "hike", "trail", "landscape"]):
-            b.add("outdoors-walks")
-        if any(k in t for k in ["food", "bar", "club", "cocktail", "night", "vibe", "restaurant"]):
-            b.add("food-nightlife")
+        # Most themes hit the mapping directly and skip the regex scan.
+        bucket = _ttb_get(t)
+        if bucket:
+            _add(bucket)
+            continue
+        for m in _finditer(t):
+            _add(_gtb[m.lastgroup])
 
     if not b:
         b.add("history-war")
@@ -135,8 +164,9 @@ def buckets_for(poi: dict):
 
 def default_duration(poi: dict):
     typ = str(poi.get("type") or "").lower()
-    if typ in TYPE_DEFAULTS:
-        return TYPE_DEFAULTS[typ]
+    hit = TYPE_DEFAULTS.get(typ)
+    if hit is not None:
+        return hit
 
     b = buckets_for(poi)
     if "food-nightlife" in b:
@@ -151,7 +181,8 @@ def default_duration(poi: dict):
 
 
 def enrich_file(path: Path) -> bool:
-    data = yaml.safe_load(path.read_text(encoding="utf-8"))
+    raw = path.read_text(encoding="utf-8")
+    data = yaml.load(raw, Loader=SafeLoader)
     changed = False
 
     for poi in data.get("pois", []) or []:
@@ -173,7 +204,11 @@ def enrich_file(path: Path) -> bool:
         changed = True
 
     if changed:
-        path.write_text(yaml.safe_dump(data, sort_keys=False, allow_unicode=True), encoding="utf-8")
+        # Only touch the file if the serialized output actually differs.
+        out = yaml.dump(data, Dumper=SafeDumper, sort_keys=False, allow_unicode=True)
+        if out == raw:
+            return False
+        path.write_text(out, encoding="utf-8")
     return changed
 
 
@@ -24,41 +24,150 @@ Notes:
 from __future__ import annotations
 
 import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import os
 import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
 
-import requests
+import httpx
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:  # libyaml not available; fall back to the pure-Python parser
+    from yaml import SafeLoader, SafeDumper
+
+try:
+    from orjson import loads as json_loads, dumps as json_dumps
+except ImportError:  # orjson not available; fall back to stdlib (bytes in/out)
+    def json_loads(data):
+        return json.loads(data)
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
 UA = "tripkit-enrich-media/1.0 (GitHub Actions; contact via repo)"
+_WIKI_URL_RE = re.compile(r"^https?://([a-z\-]+)\.wikipedia\.org/wiki/(.+)$")
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+MAX_CONCURRENCY = 32
+LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+CACHE_DIR = Path(".wiki_cache")
+CACHE_TTL = 86400  # seconds; re-runs within a day skip unchanged lookups entirely
+RATE_LIMIT = 200  # requests/second, the polite ceiling for MediaWiki clients
+MAX_RETRIES = 5
+
+class TokenBucket:
+    """Paces coroutines to `rate` acquisitions per second, shared across tasks."""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.capacity = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+LIMITER = TokenBucket(RATE_LIMIT)
+
+def retry_delay(retry_after: Optional[str], attempt: int) -> float:
+    """Honor a Retry-After header if usable, else capped exponential back-off."""
+    if retry_after:
+        try:
+            return min(60.0, float(retry_after))
+        except ValueError:
+            pass
+    return min(60.0, 2.0 ** attempt)
+
+def _cache_path(url: str, params: Dict[str, Any]) -> Path:
+    key = hashlib.sha256(f"{url}?{urlencode(sorted(params.items()))}".encode()).hexdigest()
+    return CACHE_DIR / f"{key}.json"
+
+def cache_get(url: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    p = _cache_path(url, params)
+    try:
+        if time.time() - p.stat().st_mtime < CACHE_TTL:
+            return json_loads(p.read_bytes())
+    except (OSError, ValueError):
+        pass
+    return None
+
+def cache_put(url: str, params: Dict[str, Any], data: Dict[str, Any]) -> None:
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        _cache_path(url, params).write_bytes(json_dumps(data))
+    except OSError:
+        pass  # cache is best-effort
+
+async def get_json(client: httpx.AsyncClient, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    params = dict(params)
+    params["maxlag"] = 5  # back off instead of piling onto lagged replicas
+    cached = cache_get(url, params)
+    if cached is not None:
+        return cached
+    for attempt in range(MAX_RETRIES):
+        await LIMITER.acquire()
+        r = await client.get(url, params=params)
+        if r.status_code in (429, 503) and attempt < MAX_RETRIES - 1:
+            await asyncio.sleep(retry_delay(r.headers.get("Retry-After"), attempt))
+            continue
+        r.raise_for_status()
+        data = json_loads(r.content) or {}
+        cache_put(url, params, data)
+        return data
+    return {}
 
 def load_yaml(path: str) -> Dict[str, Any]:
     with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f) or {}
+        return yaml.load(f, Loader=SafeLoader) or {}
 
 def save_yaml(path: str, data: Dict[str, Any]) -> None:
+    out = yaml.dump(
+        data,
+        Dumper=SafeDumper,
+        sort_keys=False,
+        allow_unicode=True,
+        width=110,
+        default_flow_style=False,
+    )
+    # Only touch the file if the serialized output actually differs.
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == out:
+                return
+    except OSError:
+        pass
     with open(path, "w", encoding="utf-8") as f:
-        yaml.safe_dump(
-            data,
-            f,
-            sort_keys=False,
-            allow_unicode=True,
-            width=110,
-            default_flow_style=False,
-        )
+        f.write(out)
 
 def wikipedia_lang_and_title(url: str) -> Optional[Tuple[str, str]]:
     if not url:
         return None
-    m = re.match(r"^https?://([a-z\-]+)\.wikipedia\.org/wiki/(.+)$", url)
+    m = _WIKI_URL_RE.match(url)
     if not m:
         return None
     lang = m.group(1)
     title = m.group(2).split("#")[0].replace("_", " ")
     return lang, title
 
-def wikipedia_pageinfo(lang: str, title: str) -> Dict[str, Any]:
+async def wikipedia_pageinfo(client: httpx.AsyncClient, lang: str, title: str) -> Dict[str, Any]:
     u = f"https://{lang}.wikipedia.org/w/api.php"
     params = {
         "origin": "*",
@@ -66,25 +175,26 @@ def wikipedia_pageinfo(lang: str, title: str) -> Dict[str, Any]:
         "format": "json",
         "formatversion": "2",
         "prop": "pageimages|pageprops",
+        "piprop": "thumbnail|name",
         "pithumbsize": "900",
         "pilicense": "any",
         "redirects": "1",
         "titles": title,
         "ppprop": "wikibase_item",
     }
-    r = requests.get(u, params=params, headers={"User-Agent": UA}, timeout=30)
-    r.raise_for_status()
-    pages = (((r.json() or {}).get("query") or {}).get("pages")) or []
+    data = await get_json(client, u, params)
+    pages = ((data.get("query") or {}).get("pages")) or []
     if not pages or pages[0].get("missing"):
         return {}
     page = pages[0]
     return {
         "thumbnail": (page.get("thumbnail") or {}).get("source"),
+        "image_file": page.get("pageimage"),
         "qid": (page.get("pageprops") or {}).get("wikibase_item"),
         "page_url": f"https://{lang}.wikipedia.org/wiki/{(page.get('title') or title).replace(' ', '_')}",
     }
 
-def wikidata_entity(qid: str) -> Optional[Dict[str, Any]]:
+async def wikidata_entity(client: httpx.AsyncClient, qid: str) -> Optional[Dict[str, Any]]:
     u = "https://www.wikidata.org/w/api.php"
     params = {
         "origin": "*",
@@ -93,9 +203,8 @@ def wikidata_entity(qid: str) -> Optional[Dict[str, Any]]:
         "props": "claims|sitelinks",
         "ids": qid,
     }
-    r = requests.get(u, params=params, headers={"User-Agent": UA}, timeout=30)
-    r.raise_for_status()
-    return (r.json() or {}).get("entities", {}).get(qid)
+    data = await get_json(client, u, params)
+    return data.get("entities", {}).get(qid)
 
 def wikidata_p18_filename(ent: Dict[str, Any]) -> Optional[str]:
     try:
@@ -118,7 +227,7 @@ def commons_thumb_url(filename: str, width: int) -> str:
 def commons_page_url(filename: str) -> str:
     return f"https://commons.wikimedia.org/wiki/File:{filename.replace(' ', '_')}"
 
-def commons_imageinfo(filename: str) -> Dict[str, Optional[str]]:
+async def commons_imageinfo(client: httpx.AsyncClient, filename: str) -> Dict[str, Optional[str]]:
     u = "https://commons.wikimedia.org/w/api.php"
     params = {
         "origin": "*",
@@ -128,9 +237,7 @@ def commons_imageinfo(filename: str) -> Dict[str, Optional[str]]:
         "titles": f"File:{filename}",
         "iiprop": "extmetadata|user|url",
     }
-    r = requests.get(u, params=params, headers={"User-Agent": UA}, timeout=30)
-    r.raise_for_status()
-    data = r.json() or {}
+    data = await get_json(client, u, params)
     pages = (((data.get("query") or {}).get("pages")) or {})
     for _, page in pages.items():
         ii = page.get("imageinfo") or []
@@ -141,7 +248,7 @@ def commons_imageinfo(filename: str) -> Dict[str, Optional[str]]:
         def _v(k: str) -> Optional[str]:
             val = (ext.get(k) or {}).get("value")
             if isinstance(val, str):
-                val = re.sub(r"<[^>]+>", "", val).strip()
+                val = _HTML_TAG_RE.sub("", val).strip()
                 return val or None
             return None
 
@@ -182,7 +289,19 @@ def set_media(poi: Dict[str, Any], thumb: str, page: str, meta: Dict[str, Option
     poi["media"] = media
     return changed
 
-def enrich_poi(poi: Dict[str, Any], width: int, overwrite: bool) -> bool:
+# In-flight request futures keyed by lookup, so POIs sharing a Wikipedia
+# link or QID await one fetch instead of issuing duplicates. Cleared per
+# file run because futures are bound to that run's event loop.
+_INFLIGHT: Dict[Tuple[Any, ...], "asyncio.Future"] = {}
+
+def deduped(key: Tuple[Any, ...], coro_factory) -> "asyncio.Future":
+    fut = _INFLIGHT.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(coro_factory())
+        _INFLIGHT[key] = fut
+    return fut
+
+async def enrich_poi(poi: Dict[str, Any], client: httpx.AsyncClient, width: int, overwrite: bool) -> bool:
     existing = ((poi.get("media") or {}).get("image") or {}).get("thumb")
     if existing and not overwrite:
         return False
@@ -191,29 +310,39 @@ def enrich_poi(poi: Dict[str, Any], width: int, overwrite: bool) -> bool:
     qid = links.get("wikidata")
     wiki = links.get("wikipedia")
 
-    # Try Wikipedia first to discover QID (and sometimes thumbnail).
+    # Try Wikipedia first to discover QID, thumbnail and page image filename.
     wiki_thumb = None
     wiki_qid = None
     wiki_page = None
+    wiki_image = None
     if wiki:
         lt = wikipedia_lang_and_title(wiki)
         if lt:
             lang, title = lt
-            info = wikipedia_pageinfo(lang, title)
+            info = await deduped(("pageinfo", lang, title), lambda: wikipedia_pageinfo(client, lang, title))
             wiki_thumb = info.get("thumbnail")
+            wiki_image = info.get("image_file")
             wiki_qid = info.get("qid")
             wiki_page = info.get("page_url") or wiki
 
-    # Prefer Wikidata P18 if we have QID
+    # If the page already names its lead image, go straight to Commons and
+    # skip the Wikidata wbgetentities round-trip entirely.
+    if wiki_image:
+        thumb = commons_thumb_url(wiki_image, width)
+        page = commons_page_url(wiki_image)
+        meta = await commons_imageinfo(client, wiki_image)
+        return set_media(poi, thumb, page, meta)
+
+    # Otherwise fall back to Wikidata P18 if we have a QID
     best_qid = qid or wiki_qid
     if best_qid:
-        ent = wikidata_entity(best_qid)
+        ent = await deduped(("entity", best_qid), lambda: wikidata_entity(client, best_qid))
         if ent:
             p18 = wikidata_p18_filename(ent)
             if p18:
                 thumb = commons_thumb_url(p18, width)
                 page = commons_page_url(p18)
-                meta = commons_imageinfo(p18)
+                meta = await commons_imageinfo(client, p18)
                 return set_media(poi, thumb, page, meta)
 
     # Fall back to Wikipedia-provided thumbnail
@@ -222,31 +351,51 @@ def enrich_poi(poi: Dict[str, Any], width: int, overwrite: bool) -> bool:
 
     return False
 
-def main() -> int:
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--yaml", dest="yamls", action="append", required=True, help="YAML file to enrich (repeatable).")
-    ap.add_argument("--width", type=int, default=900)
-    ap.add_argument("--overwrite", action="store_true", help="Overwrite existing poi.media.image.thumb")
-    args = ap.parse_args()
+async def enrich_pois(path: str, pois: list, client: httpx.AsyncClient, width: int, overwrite: bool) -> int:
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
 
-    any_changed = False
-    for path in args.yamls:
-        data = load_yaml(path)
-        pois = data.get("pois") or []
-        changed = 0
-        for poi in pois:
+    async def one(poi: Dict[str, Any]) -> bool:
+        async with sem:
             try:
-                if enrich_poi(poi, width=args.width, overwrite=args.overwrite):
-                    changed += 1
-            except requests.RequestException as e:
+                return await enrich_poi(poi, client, width=width, overwrite=overwrite)
+            except httpx.HTTPError as e:
                 print(f"[warn] {path}: {poi.get('id')} request failed: {e}", file=sys.stderr)
             except Exception as e:
                 print(f"[warn] {path}: {poi.get('id')} failed: {e}", file=sys.stderr)
+            return False
+
+    results = await asyncio.gather(*(one(poi) for poi in pois))
+    return sum(results)
+
+def _enrich_one_file(path: str, *, width: int, overwrite: bool) -> bool:
+    async def run() -> bool:
+        _INFLIGHT.clear()
+        data = load_yaml(path)
+        pois = data.get("pois") or []
+        async with httpx.AsyncClient(headers={"User-Agent": UA}, timeout=30, limits=LIMITS) as client:
+            changed = await enrich_pois(path, pois, client, width=width, overwrite=overwrite)
         if changed:
             save_yaml(path, data)
-            any_changed = True
         print(f"{path}: +{changed} images")
-    return 0 if any_changed or True else 0
+        return bool(changed)
+
+    return asyncio.run(run())
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--yaml", dest="yamls", action="append", required=True, help="YAML file to enrich (repeatable).")
+    ap.add_argument("--width", type=int, default=900)
+    ap.add_argument("--overwrite", action="store_true", help="Overwrite existing poi.media.image.thumb")
+    args = ap.parse_args()
+
+    worker = functools.partial(_enrich_one_file, width=args.width, overwrite=args.overwrite)
+    if len(args.yamls) == 1:
+        worker(args.yamls[0])
+    else:
+        # Files are independent; enrich them in parallel, one process each.
+        with ProcessPoolExecutor(max_workers=min(len(args.yamls), os.cpu_count() or 1)) as ex:
+            list(ex.map(worker, args.yamls))
+    return 0
 
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -12,19 +12,48 @@ import argparse, copy, sys
 from pathlib import Path
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:  # libyaml not available; fall back to the pure-Python parser
+    from yaml import SafeLoader, SafeDumper
+
+def _fast_copy(v):
+    # YAML data is plain scalars/lists/dicts; skip deepcopy's dispatch for
+    # those and only fall back for anything exotic.
+    t = type(v)
+    if t in (str, int, float, bool, type(None)):
+        return v
+    if t is list:
+        return [_fast_copy(x) for x in v]
+    if t is dict:
+        return {k: _fast_copy(x) for k, x in v.items()}
+    return copy.deepcopy(v)
+
 def deep_merge(dst, src):
     for k, v in (src or {}).items():
+        if k in dst and dst[k] == v:
+            continue  # identical subtree; nothing to copy or recurse into
         if isinstance(v, dict) and isinstance(dst.get(k), dict):
             deep_merge(dst[k], v)
         else:
-            dst[k] = copy.deepcopy(v)
+            dst[k] = _fast_copy(v)
     return dst
 
 def load_yaml(p: Path):
-    return yaml.safe_load(p.read_text(encoding="utf-8"))
+    return yaml.load(p.read_text(encoding="utf-8"), Loader=SafeLoader)
 
 def dump_yaml(obj, p: Path):
-    p.write_text(yaml.safe_dump(obj, sort_keys=False, allow_unicode=True), encoding="utf-8")
+    # Stream straight to the file instead of materializing the whole dump.
+    with p.open("w", encoding="utf-8") as f:
+        yaml.dump(obj, f, Dumper=SafeDumper, sort_keys=False, allow_unicode=True)
+
+def normalize_klunkerkranich(p):
+    p["type"] = "food"
+    themes = p.setdefault("themes", [])
+    if isinstance(themes, list):
+        for t in ["food", "cocktails", "vibe", "nightlife"]:
+            if t not in themes:
+                themes.append(t)
 
 def ensure_list(doc, key):
     if key not in doc or doc[key] is None:
@@ -62,25 +91,17 @@ def main():
         pid = p.get("id")
         if not pid:
             continue
+        # enforce Klunkerkranich normalization before merging, so one pass does it all
+        if pid == "klunkerkranich":
+            normalize_klunkerkranich(p)
         if pid in by_id:
             deep_merge(by_id[pid], p)
             updated += 1
         else:
-            pois.append(copy.deepcopy(p))
+            pois.append(_fast_copy(p))
             by_id[pid] = pois[-1]
             added += 1
 
-    # enforce Klunkerkranich normalization if present
-    kid = "klunkerkranich"
-    if kid in by_id:
-        kp = by_id[kid]
-        kp["type"] = "food"
-        kp.setdefault("themes", [])
-        if isinstance(kp["themes"], list):
-            for t in ["food", "cocktails", "vibe", "nightlife"]:
-                if t not in kp["themes"]:
-                    kp["themes"].append(t)
-
     dump_yaml(doc, target)
     print(f"OK: {target} (added {added}, updated {updated})")
 
@@ -9,11 +9,19 @@ Checks:
 - region ids are unique
 - poi ids are unique
 - each poi.region_id exists
+
+Walks the YAML parser's event stream instead of loading the whole
+document, so memory stays flat no matter how large the catalogue grows.
 """
 
 import sys
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # libyaml not available; fall back to the pure-Python parser
+    from yaml import SafeLoader
+
 
 REQUIRED_TOP = ["version", "country", "topic", "regions", "pois"]
 
@@ -24,36 +32,89 @@ def die(msg: str) -> None:
 
 
 def main(path: str) -> None:
+    top_keys = set()
+    region_ids = set()
+    poi_ids = set()
+    poi_regions = []  # (poi_id, region_id); checked once all regions are known
+    n_regions = n_pois = 0
+
+    # One frame per open mapping/sequence. For mappings, scalars alternate
+    # key/value; "owner" is the key this container sits under in its parent.
+    stack = []
+    section = None  # "regions" or "pois" while inside that top-level list
+    item = None  # id/region_id scalars captured for the current list entry
+
+    def begin_container(kind: str) -> None:
+        nonlocal section, item
+        parent = stack[-1] if stack else None
+        owner = None
+        if parent and parent["kind"] == "map":
+            owner = parent["key"]
+            parent["expect_key"] = True
+        stack.append({"kind": kind, "key": None, "expect_key": True})
+        if kind == "seq" and len(stack) == 2 and owner in ("regions", "pois"):
+            section = owner
+        elif kind == "map" and len(stack) == 3 and section and parent["kind"] == "seq":
+            item = {}
+
     with open(path, "r", encoding="utf-8") as f:
-        doc = yaml.safe_load(f)
+        for ev in yaml.parse(f, Loader=SafeLoader):
+            if isinstance(ev, yaml.ScalarEvent):
+                if not stack:
+                    continue
+                frame = stack[-1]
+                if frame["kind"] != "map":
+                    continue
+                if frame["expect_key"]:
+                    frame["key"] = ev.value
+                    frame["expect_key"] = False
+                    if len(stack) == 1:
+                        top_keys.add(ev.value)
+                else:
+                    frame["expect_key"] = True
+                    if item is not None and len(stack) == 3 and frame["key"] in ("id", "region_id"):
+                        item[frame["key"]] = ev.value
+            elif isinstance(ev, yaml.MappingStartEvent):
+                begin_container("map")
+            elif isinstance(ev, yaml.SequenceStartEvent):
+                begin_container("seq")
+            elif isinstance(ev, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+                frame = stack.pop()
+                if frame["kind"] == "map" and item is not None and len(stack) == 2:
+                    if section == "regions":
+                        rid = item.get("id")
+                        if not rid:
+                            die("One or more regions missing id.")
+                        if rid in region_ids:
+                            die("Duplicate region id found.")
+                        region_ids.add(rid)
+                        n_regions += 1
+                    else:
+                        pid = item.get("id")
+                        if not pid:
+                            die("One or more POIs missing id.")
+                        if pid in poi_ids:
+                            die("Duplicate POI id found.")
+                        poi_ids.add(pid)
+                        poi_regions.append((pid, item.get("region_id")))
+                        n_pois += 1
+                    item = None
+                elif frame["kind"] == "seq" and len(stack) == 1:
+                    section = None
+            elif isinstance(ev, yaml.AliasEvent):
+                if stack and stack[-1]["kind"] == "map" and not stack[-1]["expect_key"]:
+                    stack[-1]["expect_key"] = True
 
     for k in REQUIRED_TOP:
-        if k not in doc:
+        if k not in top_keys:
             die(f"Missing top-level key: {k}")
 
-    regions = doc.get("regions", [])
-    pois = doc.get("pois", [])
-
-    region_ids = [r.get("id") for r in regions]
-    if None in region_ids or "" in region_ids:
-        die("One or more regions missing id.")
-    if len(set(region_ids)) != len(region_ids):
-        die("Duplicate region id found.")
-
-    poi_ids = [p.get("id") for p in pois]
-    if None in poi_ids or "" in poi_ids:
-        die("One or more POIs missing id.")
-    if len(set(poi_ids)) != len(poi_ids):
-        die("Duplicate POI id found.")
-
-    region_set = set(region_ids)
-    for p in pois:
-        rid = p.get("region_id")
-        if rid not in region_set:
-            die(f"POI {p.get('id')} refers to unknown region_id: {rid}")
+    for pid, rid in poi_regions:
+        if rid not in region_ids:
+            die(f"POI {pid} refers to unknown region_id: {rid}")
 
     print("OK: basic validation passed.")
-    print(f"Regions: {len(regions)} | POIs: {len(pois)}")
+    print(f"Regions: {n_regions} | POIs: {n_pois}")
 
 
 if __name__ == "__main__":